@@ -1,21 +1,43 @@
 import os
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
 
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./app.db")
+# Plain driverless URLs (e.g. from older deployments) are served through the matching async driver.
+ASYNC_DRIVER_SCHEMES = {
+    "sqlite://": "sqlite+aiosqlite://",
+    "postgresql://": "postgresql+asyncpg://",
+    "postgres://": "postgresql+asyncpg://",
+}
+for scheme, async_scheme in ASYNC_DRIVER_SCHEMES.items():
+    if DATABASE_URL.startswith(scheme):
+        DATABASE_URL = DATABASE_URL.replace(scheme, async_scheme, 1)
+        break
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {},
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_async_engine(DATABASE_URL)
+
+
+if DATABASE_URL.startswith("sqlite"):
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL lets readers proceed during writes; NORMAL sync skips the fsync on every commit in WAL mode.
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        # SQLite ignores ON DELETE CASCADE unless foreign keys are enabled per connection.
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+# Objects stay usable after commit; async sessions cannot lazily refresh expired attributes.
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -1,15 +1,24 @@
+import asyncio
+import hashlib
+import hmac
 import os
-import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
-from fastapi import Depends, FastAPI, Header, HTTPException
+import jwt
+from cachetools import TTLCache
+from fastapi import Depends, FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from jose import JWTError, jwt
+from fastapi.responses import ORJSONResponse
 from passlib.context import CryptContext
-from sqlalchemy import select, text
-from sqlalchemy.orm import Session, selectinload
+from pydantic import TypeAdapter
+from sqlalchemy import delete, inspect, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, raiseload
 
-from .db import Base, engine, get_db
+from .db import DATABASE_URL, Base, engine, get_db
 from .models import Reply, Thread, User
 from .schemas import (
     AuthResponse,
@@ -24,21 +33,44 @@ from .schemas import (
     UserSignin,
 )
 
-app = FastAPI(title="Anonymous Threads API")
+app = FastAPI(title="Anonymous Threads API", default_response_class=ORJSONResponse)
 
 cors_origins = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "*").split(",") if origin.strip()]
 app.add_middleware(
     CORSMiddleware,
     allow_origins=cors_origins or ["*"],
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["Authorization", "Content-Type", "X-Owner-Token"],
+    # Let browsers reuse preflight results for a day instead of re-issuing OPTIONS.
+    max_age=86400,
 )
 
+run_legacy_migration = os.getenv("RUN_LEGACY_MIGRATION", "").lower() in {"1", "true", "yes"}
+
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
-jwt_secret = os.getenv("JWT_SECRET", "dev-secret")
+# Hashing is CPU-bound; a dedicated pool keeps it from starving the shared request threadpool.
+_password_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="password-hash")
+jwt_secret = os.getenv("JWT_SECRET", "dev-secret").encode("utf-8")
 jwt_algorithm = "HS256"
 jwt_expiry_hours = 24 * 7
+jwt_cache_ttl_seconds = 10
+user_cache_ttl_seconds = 60
+
+# TTLCache is not thread-safe; hold this lock for every cache access so the caches stay
+# correct even if get_current_user ends up running on the threadpool again.
+_auth_cache_lock = threading.Lock()
+# Decoded token payloads keyed by SHA-256 of the token, so the raw token never sits in memory.
+_jwt_cache: TTLCache = TTLCache(maxsize=10000, ttl=jwt_cache_ttl_seconds)
+# Detached user snapshots keyed by user id; ORM instances are never shared across sessions.
+_user_cache: TTLCache = TTLCache(maxsize=5000, ttl=user_cache_ttl_seconds)
+# Built once so the hot listing path reuses the compiled validator and serializer.
+_threads_adapter = TypeAdapter(list[ThreadRead])
+
+owner_token_bytes = 16
+# Owner tokens are sliced from a pooled os.urandom buffer to avoid a syscall per post.
+_owner_token_pool = bytearray()
+_owner_token_lock = threading.Lock()
 
 
 def create_access_token(user: User) -> str:
@@ -52,196 +84,267 @@ def create_access_token(user: User) -> str:
     return jwt.encode(payload, jwt_secret, algorithm=jwt_algorithm)
 
 
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_password_pool, pwd_context.hash, password)
+
+
+async def verify_password(password: str, password_hash: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(_password_pool, pwd_context.verify, password, password_hash)
+
+
+def new_owner_token() -> str:
+    with _owner_token_lock:
+        if len(_owner_token_pool) < owner_token_bytes:
+            _owner_token_pool.extend(os.urandom(4096))
+        token = bytes(_owner_token_pool[:owner_token_bytes])
+        del _owner_token_pool[:owner_token_bytes]
+    return token.hex()
+
+
 def ensure_password_length(password: str) -> str:
-    if len(password.encode("utf-8")) > 72:
+    # ASCII text is one byte per character, so only non-ASCII passwords need encoding to measure.
+    byte_length = len(password) if password.isascii() else len(password.encode("utf-8"))
+    if byte_length > 72:
         raise HTTPException(status_code=400, detail="Password too long (max 72 bytes).")
     return password
 
 
-def get_current_user(
+def decode_access_token(token: str) -> dict:
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    now = time.time()
+    with _auth_cache_lock:
+        cached = _jwt_cache.get(key)
+        if cached is not None:
+            payload, expires_at = cached
+            if now < expires_at:
+                return payload
+            _jwt_cache.pop(key, None)
+    try:
+        payload = jwt.decode(token, jwt_secret, algorithms=[jwt_algorithm], options={"require": ["exp", "sub"]})
+    except jwt.PyJWTError as exc:
+        raise HTTPException(status_code=401, detail="Invalid authentication token.") from exc
+    # Never serve a cached payload past the token's own expiry.
+    with _auth_cache_lock:
+        _jwt_cache[key] = (payload, min(float(payload["exp"]), now + jwt_cache_ttl_seconds))
+    return payload
+
+
+def owner_token_matches(provided: str | None, expected: str) -> bool:
+    if not provided:
+        return False
+    # compare_digest rejects non-ASCII str, so compare the encoded bytes.
+    return hmac.compare_digest(provided.encode("utf-8"), expected.encode("utf-8"))
+
+
+async def get_current_user(
     authorization: str | None = Header(default=None, alias="Authorization"),
-    db: Session = Depends(get_db),
-) -> User:
+    db: AsyncSession = Depends(get_db),
+) -> UserRead:
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing authentication token.")
     token = authorization.split(" ", 1)[1]
-    try:
-        payload = jwt.decode(token, jwt_secret, algorithms=[jwt_algorithm])
-    except JWTError as exc:
-        raise HTTPException(status_code=401, detail="Invalid authentication token.") from exc
+    payload = decode_access_token(token)
     user_id = payload.get("sub")
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid authentication token.")
-    user = db.get(User, int(user_id))
+    user_id = int(user_id)
+    with _auth_cache_lock:
+        cached_user = _user_cache.get(user_id)
+    if cached_user is not None:
+        return cached_user
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=401, detail="User not found.")
-    return user
+    current_user = UserRead.model_validate(user)
+    with _auth_cache_lock:
+        _user_cache[user_id] = current_user
+    return current_user
 
 
-@app.on_event("startup")
-def on_startup():
-    Base.metadata.create_all(bind=engine)
-    # Lightweight migration for existing SQLite DBs created before ownership tokens were added.
-    with engine.begin() as conn:
-        thread_columns = {row[1] for row in conn.execute(text("PRAGMA table_info(threads)"))}
-        if "owner_token" not in thread_columns:
-            conn.execute(text("ALTER TABLE threads ADD COLUMN owner_token VARCHAR(64) NOT NULL DEFAULT ''"))
+def run_legacy_sqlite_migration(conn):
+    # Opt-in migration for existing SQLite DBs created before ownership tokens were added.
+    thread_columns = {row[1] for row in conn.execute(text("PRAGMA table_info(threads)"))}
+    if "owner_token" not in thread_columns:
+        conn.execute(text("ALTER TABLE threads ADD COLUMN owner_token VARCHAR(64) NOT NULL DEFAULT ''"))
+
+    reply_columns = {row[1] for row in conn.execute(text("PRAGMA table_info(replies)"))}
+    if "owner_token" not in reply_columns:
+        conn.execute(text("ALTER TABLE replies ADD COLUMN owner_token VARCHAR(64) NOT NULL DEFAULT ''"))
+
+
+def index_exists(conn, table_name: str, index_name: str) -> bool:
+    if conn.dialect.name == "sqlite":
+        # One catalog lookup; the inspector would read every index on the table.
+        query = text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name")
+        return conn.execute(query, {"name": index_name}).first() is not None
+    return inspect(conn).has_index(table_name, index_name)
 
-        reply_columns = {row[1] for row in conn.execute(text("PRAGMA table_info(replies)"))}
-        if "owner_token" not in reply_columns:
-            conn.execute(text("ALTER TABLE replies ADD COLUMN owner_token VARCHAR(64) NOT NULL DEFAULT ''"))
+
+def sync_indexes(conn):
+    # create_all only builds indexes for new tables, so bring existing ones up to date once;
+    # the composite replies index marks a schema that has already been brought up to date.
+    if index_exists(conn, "replies", "ix_replies_thread_parent"):
+        return
+    for index_name in ("ix_threads_owner_token", "ix_replies_owner_token", "ix_replies_thread_id"):
+        conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+    for index in (*Thread.__table__.indexes, *Reply.__table__.indexes):
+        index.create(bind=conn, checkfirst=True)
+
+
+@app.on_event("startup")
+async def on_startup():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(sync_indexes)
+        if run_legacy_migration and DATABASE_URL.startswith("sqlite"):
+            await conn.run_sync(run_legacy_sqlite_migration)
 
 
 @app.get("/health")
-def health():
+async def health():
     return {"ok": True}
 
 
 @app.post("/auth/signup", response_model=AuthResponse, status_code=201)
-def signup(payload: UserCreate, db: Session = Depends(get_db)):
+async def signup(payload: UserCreate, db: AsyncSession = Depends(get_db)):
     username = payload.username.strip()
     email = payload.email.strip().lower()
     password = ensure_password_length(payload.password)
-    if db.execute(select(User).where(User.username == username)).scalar_one_or_none():
+    if await db.scalar(select(User.id).where(User.username == username)) is not None:
         raise HTTPException(status_code=409, detail="Username already exists.")
-    if db.execute(select(User).where(User.email == email)).scalar_one_or_none():
+    if await db.scalar(select(User.id).where(User.email == email)) is not None:
         raise HTTPException(status_code=409, detail="Email already exists.")
 
-    user = User(username=username, email=email, password_hash=pwd_context.hash(password))
+    user = User(username=username, email=email, password_hash=await hash_password(password))
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return AuthResponse(access_token=create_access_token(user), user=UserRead.model_validate(user))
 
 
 @app.post("/auth/signin", response_model=AuthResponse)
-def signin(payload: UserSignin, db: Session = Depends(get_db)):
+async def signin(payload: UserSignin, db: AsyncSession = Depends(get_db)):
     email = payload.email.strip().lower() if payload.email else None
     username = payload.username.strip() if payload.username else None
     password = ensure_password_length(payload.password)
     user = None
     if email:
-        user = db.execute(select(User).where(User.email == email)).scalar_one_or_none()
+        user = await db.scalar(select(User).where(User.email == email))
     if not user and username:
-        user = db.execute(select(User).where(User.username == username)).scalar_one_or_none()
-    if not user or not pwd_context.verify(password, user.password_hash):
+        user = await db.scalar(select(User).where(User.username == username))
+    if not user or not await verify_password(password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials.")
     return AuthResponse(access_token=create_access_token(user), user=UserRead.model_validate(user))
 
 
 @app.get("/auth/me", response_model=UserRead)
-def me(current_user: User = Depends(get_current_user)):
-    return UserRead.model_validate(current_user)
+async def me(current_user: UserRead = Depends(get_current_user)):
+    return current_user
 
 
 @app.get("/threads", response_model=list[ThreadRead])
-def list_threads(db: Session = Depends(get_db)):
-    threads = (
-        db.execute(select(Thread).options(selectinload(Thread.replies)).order_by(Thread.created_at.desc()))
-        .scalars()
-        .all()
+async def list_threads(db: AsyncSession = Depends(get_db)):
+    # Anything not eagerly loaded raises up front instead of lazy loading (MissingGreenlet) during serialization.
+    query = (
+        select(Thread)
+        .options(joinedload(Thread.replies).raiseload("*"), raiseload("*"))
+        .order_by(Thread.created_at.desc())
+    )
+    threads = (await db.scalars(query)).unique().all()
+    return Response(
+        content=_threads_adapter.dump_json(_threads_adapter.validate_python(threads, from_attributes=True)),
+        media_type="application/json",
     )
-    return threads
 
 
 @app.post("/threads", response_model=ThreadCreateResponse, status_code=201)
-def create_thread(
+async def create_thread(
     payload: ThreadCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserRead = Depends(get_current_user),
 ):
     author_name = None if payload.is_anonymous else (payload.author_name or current_user.username)
-    owner_token = payload.owner_token or secrets.token_hex(16)
+    owner_token = payload.owner_token or new_owner_token()
     thread = Thread(
-        title=payload.title.strip(),
-        body=payload.body.strip(),
-        author_name=author_name.strip() if author_name else None,
+        title=payload.title,
+        body=payload.body,
+        author_name=author_name,
         is_anonymous=payload.is_anonymous,
         owner_token=owner_token,
+        replies=[],
     )
     db.add(thread)
-    db.commit()
-    db.refresh(thread)
+    await db.commit()
+    # Only reload the server default; a full refresh would leave replies to an async lazy load.
+    await db.refresh(thread, attribute_names=["created_at"])
     return thread
 
 
 @app.post("/threads/{thread_id}/replies", response_model=ReplyCreateResponse, status_code=201)
-def create_reply(
+async def create_reply(
     thread_id: int,
     payload: ReplyCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserRead = Depends(get_current_user),
 ):
-    thread = db.get(Thread, thread_id)
+    thread = await db.get(Thread, thread_id)
     if not thread:
         raise HTTPException(status_code=404, detail="Thread not found.")
 
     if payload.parent_id is not None:
-        parent_reply = db.get(Reply, payload.parent_id)
+        parent_reply = await db.get(Reply, payload.parent_id)
         if not parent_reply or parent_reply.thread_id != thread_id:
             raise HTTPException(status_code=400, detail="Invalid parent reply.")
 
     author_name = None if payload.is_anonymous else (payload.author_name or current_user.username)
-    owner_token = payload.owner_token or secrets.token_hex(16)
+    owner_token = payload.owner_token or new_owner_token()
     reply = Reply(
         thread_id=thread_id,
         parent_id=payload.parent_id,
-        body=payload.body.strip(),
-        author_name=author_name.strip() if author_name else None,
+        body=payload.body,
+        author_name=author_name,
         is_anonymous=payload.is_anonymous,
         owner_token=owner_token,
     )
     db.add(reply)
-    db.commit()
-    db.refresh(reply)
+    await db.commit()
+    await db.refresh(reply)
     return reply
 
 
 @app.delete("/threads/{thread_id}", status_code=204)
-def delete_thread(
+async def delete_thread(
     thread_id: int,
     owner_token: str | None = Header(default=None, alias="X-Owner-Token"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    thread = db.get(Thread, thread_id)
-    if not thread:
+    thread_owner_token = await db.scalar(select(Thread.owner_token).where(Thread.id == thread_id))
+    if thread_owner_token is None:
         raise HTTPException(status_code=404, detail="Thread not found.")
-    if not owner_token or owner_token != thread.owner_token:
+    if not owner_token_matches(owner_token, thread_owner_token):
         raise HTTPException(status_code=403, detail="You can only delete your own thread.")
 
-    db.delete(thread)
-    db.commit()
+    # Replies are removed by the ON DELETE CASCADE on replies.thread_id.
+    await db.execute(delete(Thread).where(Thread.id == thread_id), execution_options={"synchronize_session": False})
+    await db.commit()
 
 
 @app.delete("/threads/{thread_id}/replies/{reply_id}", status_code=204)
-def delete_reply(
+async def delete_reply(
     thread_id: int,
     reply_id: int,
     owner_token: str | None = Header(default=None, alias="X-Owner-Token"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    reply = db.get(Reply, reply_id)
-    if not reply or reply.thread_id != thread_id:
+    # Only the owner token is needed to authorize, so skip loading the reply body.
+    reply_owner_token = await db.scalar(
+        select(Reply.owner_token).where(Reply.id == reply_id, Reply.thread_id == thread_id)
+    )
+    if reply_owner_token is None:
         raise HTTPException(status_code=404, detail="Reply not found.")
-    if not owner_token or owner_token != reply.owner_token:
+    if not owner_token_matches(owner_token, reply_owner_token):
         raise HTTPException(status_code=403, detail="You can only delete your own reply.")
 
-    all_replies = db.execute(select(Reply).where(Reply.thread_id == thread_id)).scalars().all()
-    children_by_parent: dict[int, list[Reply]] = {}
-    for item in all_replies:
-        if item.parent_id is not None:
-            children_by_parent.setdefault(item.parent_id, []).append(item)
-
-    to_delete_ids: set[int] = set()
-    stack = [reply.id]
-    while stack:
-        current = stack.pop()
-        if current in to_delete_ids:
-            continue
-        to_delete_ids.add(current)
-        stack.extend(child.id for child in children_by_parent.get(current, []))
-
-    for item in all_replies:
-        if item.id in to_delete_ids:
-            db.delete(item)
-    db.commit()
+    # Descendants are removed by the ON DELETE CASCADE on replies.parent_id.
+    await db.execute(delete(Reply).where(Reply.id == reply_id), execution_options={"synchronize_session": False})
+    await db.commit()
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, String, Text, func
+from sqlalchemy import Boolean, DateTime, ForeignKey, Index, Integer, String, Text, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .db import Base
@@ -24,22 +24,33 @@ class Thread(Base):
     body: Mapped[str] = mapped_column(Text, nullable=False)
     author_name: Mapped[str | None] = mapped_column(String(100), nullable=True)
     is_anonymous: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
-    owner_token: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    owner_token: Mapped[str] = mapped_column(String(64), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
-    replies = relationship("Reply", back_populates="thread", cascade="all, delete-orphan")
+    replies = relationship(
+        "Reply",
+        back_populates="thread",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        order_by="Reply.id",
+    )
 
 
 class Reply(Base):
     __tablename__ = "replies"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    thread_id: Mapped[int] = mapped_column(ForeignKey("threads.id", ondelete="CASCADE"), nullable=False, index=True)
+    thread_id: Mapped[int] = mapped_column(ForeignKey("threads.id", ondelete="CASCADE"), nullable=False)
     parent_id: Mapped[int | None] = mapped_column(ForeignKey("replies.id", ondelete="CASCADE"), nullable=True, index=True)
     body: Mapped[str] = mapped_column(Text, nullable=False)
     author_name: Mapped[str | None] = mapped_column(String(100), nullable=True)
     is_anonymous: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
-    owner_token: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    owner_token: Mapped[str] = mapped_column(String(64), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     thread = relationship("Thread", back_populates="replies")
+
+
+Index("ix_threads_created_at", Thread.created_at.desc())
+# Also serves thread_id-only lookups, so thread_id needs no index of its own.
+Index("ix_replies_thread_parent", Reply.thread_id, Reply.parent_id)
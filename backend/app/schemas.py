@@ -1,6 +1,15 @@
 from datetime import datetime
+from typing import Annotated
 
-from pydantic import BaseModel, Field, model_validator
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, model_validator
+
+
+def _strip_whitespace(value):
+    return value.strip() if isinstance(value, str) else value
+
+
+# Stripped before validation, so length limits apply to the normalized text.
+StrippedStr = Annotated[str, BeforeValidator(_strip_whitespace)]
 
 
 class UserCreate(BaseModel):
@@ -21,8 +30,7 @@ class UserRead(BaseModel):
     email: str
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class AuthResponse(BaseModel):
@@ -32,9 +40,9 @@ class AuthResponse(BaseModel):
 
 
 class ThreadCreate(BaseModel):
-    title: str = Field(..., min_length=3, max_length=200)
-    body: str = Field(..., min_length=1, max_length=4000)
-    author_name: str | None = Field(default=None, max_length=100)
+    title: StrippedStr = Field(..., min_length=3, max_length=200)
+    body: StrippedStr = Field(..., min_length=1, max_length=4000)
+    author_name: StrippedStr | None = Field(default=None, max_length=100)
     is_anonymous: bool = True
     owner_token: str | None = Field(default=None, min_length=8, max_length=64)
 
@@ -46,9 +54,9 @@ class ThreadCreate(BaseModel):
 
 
 class ReplyCreate(BaseModel):
-    body: str = Field(..., min_length=1, max_length=4000)
+    body: StrippedStr = Field(..., min_length=1, max_length=4000)
     parent_id: int | None = None
-    author_name: str | None = Field(default=None, max_length=100)
+    author_name: StrippedStr | None = Field(default=None, max_length=100)
     is_anonymous: bool = True
     owner_token: str | None = Field(default=None, min_length=8, max_length=64)
 
@@ -68,8 +76,7 @@ class ReplyRead(BaseModel):
     is_anonymous: bool
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ThreadRead(BaseModel):
@@ -81,8 +88,7 @@ class ThreadRead(BaseModel):
     created_at: datetime
     replies: list[ReplyRead] = Field(default_factory=list)
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ThreadCreateResponse(ThreadRead):